@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import json
+import uuid
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# --- REGISTRO DE FUENTES DE DATOS ---
+# Este módulo no importa Streamlit. El pool de procesos se levanta en un intérprete
+# aparte que ejecuta este archivo como principal: bajo `streamlit run` el script de la
+# app está instalado como __main__ y los workers 'spawn' lo reimportarían completo.
+
+COLUMNAS_PROYECTO = [
+    'nombre', 'etapa', 'tipo', 'monto_contrato', 'comuna', 'barrio', 'lat', 'lng',
+    'fecha_inicio', 'fecha_fin_inicial', 'licitacion_oferta_empresa'
+]
+
+FUENTE_MANUAL = 'manual' # Partición de los proyectos creados desde el CRUD
+FORMATO_FECHA_DB = '%Y-%m-%d' # Formato de fecha almacenado (date()/julianday() de SQLite lo requieren)
+
+# Cada fuente declara su archivo, el mapeo columna destino -> columna origen y el formato
+# de sus fechas. Las columnas destino sin mapeo se cargan vacías.
+FUENTES = {
+    'caba_obras': {
+        'descripcion': 'Obras Urbanas CABA (BA Obras)',
+        'archivo': 'observatorioObrasUrbanas_limpio.csv',
+        'sep': ',',
+        'encoding': 'utf-8',
+        'columnas': {col: col for col in COLUMNAS_PROYECTO},
+        'formato_fecha': '%Y-%m-%d',
+    },
+}
+
+def clean_source_df(df, columnas, formato_fecha=None):
+    df_clean = pd.DataFrame(index=df.index)
+    for destino in COLUMNAS_PROYECTO:
+        origen = columnas.get(destino)
+        df_clean[destino] = df[origen] if origen in df.columns else None
+    df_clean['monto_contrato'] = pd.to_numeric(df_clean['monto_contrato'], errors='coerce').fillna(0)
+    df_clean['comuna'] = pd.to_numeric(df_clean['comuna'], errors='coerce').fillna(0).astype(int)
+    for col in ['lat', 'lng']:
+        df_clean[col] = df_clean[col].astype(str).str.replace(',', '.', regex=False)
+        df_clean[col] = df_clean[col].apply(lambda x: re.sub(r'[^\d.-]', '', x))
+        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(0.0)
+    for col in ['fecha_inicio', 'fecha_fin_inicial']:
+        # Fechas inválidas quedan en NULL
+        df_clean[col] = pd.to_datetime(df_clean[col], format=formato_fecha, errors='coerce').dt.strftime(FORMATO_FECHA_DB)
+    return df_clean.reset_index(drop=True)
+
+def parse_source(fuente_id):
+    """Lee y limpia una fuente registrada. Se ejecuta dentro del pool de procesos."""
+    config = FUENTES[fuente_id]
+    df = pd.read_csv(config['archivo'], sep=config.get('sep', ','), encoding=config.get('encoding', 'utf-8'), low_memory=False)
+    df_clean = clean_source_df(df, config['columnas'], config.get('formato_fecha'))
+    df_clean['id'] = [str(uuid.uuid4()) for _ in range(len(df_clean))]
+    df_clean['fuente'] = fuente_id
+    return df_clean
+
+def _parse_one(fuente_id):
+    try:
+        return parse_source(fuente_id), None
+    except FileNotFoundError:
+        return None, "FileNotFound"
+    except Exception as e:
+        return None, str(e)
+
+def _parse_pool(fuente_ids, destino):
+    # Corre en el intérprete auxiliar: deja cada partición y los errores en 'destino'
+    errores = {}
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(len(fuente_ids), multiprocessing.cpu_count()), mp_context=contexto) as pool:
+        futuros = {fuente_id: pool.submit(_parse_one, fuente_id) for fuente_id in fuente_ids}
+        for fuente_id, futuro in futuros.items():
+            df_fuente, error = futuro.result()
+            if error is None:
+                df_fuente.to_pickle(os.path.join(destino, f"{fuente_id}.pkl"))
+            else:
+                errores[fuente_id] = error
+    with open(os.path.join(destino, 'errores.json'), 'w', encoding='utf-8') as f:
+        json.dump(errores, f)
+
+def parse_sources(fuente_ids):
+    """Parsea varias fuentes en paralelo. Devuelve {fuente: DataFrame} y {fuente: error}."""
+    if len(fuente_ids) == 1:
+        # Una sola fuente: no vale la pena levantar el pool
+        df_fuente, error = _parse_one(fuente_ids[0])
+        return ({fuente_ids[0]: df_fuente}, {}) if error is None else ({}, {fuente_ids[0]: error})
+    resultados, errores = {}, {}
+    with tempfile.TemporaryDirectory() as destino:
+        proceso = subprocess.run([sys.executable, os.path.abspath(__file__), destino, *fuente_ids],
+                                 capture_output=True, text=True)
+        if proceso.returncode != 0:
+            detalle = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else f"código {proceso.returncode}"
+            return {}, {fuente_id: detalle for fuente_id in fuente_ids}
+        with open(os.path.join(destino, 'errores.json'), encoding='utf-8') as f:
+            errores = json.load(f)
+        for fuente_id in fuente_ids:
+            if fuente_id not in errores:
+                resultados[fuente_id] = pd.read_pickle(os.path.join(destino, f"{fuente_id}.pkl"))
+    return resultados, errores
+
+if __name__ == "__main__":
+    _parse_pool(sys.argv[2:], sys.argv[1])
@@ -3,10 +3,13 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import uuid
 import re
 import os 
+import threading
+from cachetools import LRUCache
+from ingesta import FUENTES, FUENTE_MANUAL, parse_source, parse_sources
 
 # --- 1. CONFIGURACIÓN INICIAL Y DATOS DE PRUEBA ---
 
@@ -75,8 +78,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-CSV_FILE_NAME = 'observatorioObrasUrbanas_limpio.csv'
+FUENTE_MIGRACION = 'caba_obras' # Fuente de la que se cargaron las filas previas al registro de fuentes
 DB_NAME = 'db_observatorio.sqlite'
+FILTER_CACHE_SIZE = 256 # Máximo de vistas filtradas y agregados retenidos en el LRU
+SIN_DATOS_FILTRO = "Sin datos para los filtros seleccionados."
 
 # Inicializar estados de sesion (sin cambios)
 if 'authenticated' not in st.session_state:
@@ -89,6 +94,8 @@ if 'data' not in st.session_state:
     st.session_state.data = None
 if 'initial_load_success' not in st.session_state: 
     st.session_state.initial_load_success = False
+if 'fuentes' not in st.session_state:
+    st.session_state.fuentes = []
 
 # --- 2. FUNCIONES DE BASE DE DATOS (SQLite) ---
 # (Sin cambios en la lógica de DB - Tu código es robusto)
@@ -113,42 +120,101 @@ def init_db():
             id TEXT PRIMARY KEY, nombre TEXT, etapa TEXT, tipo TEXT,
             monto_contrato REAL, comuna INTEGER, barrio TEXT,
             lat REAL, lng REAL, fecha_inicio TEXT, fecha_fin_inicial TEXT,
-            licitacion_oferta_empresa TEXT
+            licitacion_oferta_empresa TEXT, fuente TEXT
         )
     ''')
+    # Migración: las bases previas al registro de fuentes no tienen la columna de partición
+    columnas = [fila[1] for fila in cursor.execute("PRAGMA table_info(proyectos)")]
+    if 'fuente' not in columnas:
+        cursor.execute("ALTER TABLE proyectos ADD COLUMN fuente TEXT")
+        migrate_legacy_partitions(conn)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_proyectos_fuente ON proyectos (fuente)")
+    # Versión de datos por partición: se incrementa en cada escritura para invalidar índices y vistas cacheadas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versiones (
+            particion TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for particion in list(FUENTES) + [FUENTE_MANUAL]:
+        cursor.execute("INSERT OR IGNORE INTO versiones (particion, version) VALUES (?, 0)", (particion,))
     conn.commit()
     conn.close()
 
-@st.cache_data(ttl=600)
-def load_initial_data_from_csv():
+def migrate_legacy_partitions(conn):
+    """Asigna partición a las filas previas al registro: las que coinciden con el archivo de
+    FUENTE_MIGRACION van a esa fuente y el resto (altas desde el CRUD) a FUENTE_MANUAL."""
+    def claves(df):
+        return list(zip(df['nombre'].fillna(''), df['barrio'].fillna(''), df['monto_contrato'].fillna(0).round(2)))
+    df_filas = pd.read_sql("SELECT id, nombre, barrio, monto_contrato FROM proyectos", conn)
+    try:
+        claves_fuente = set(claves(parse_source(FUENTE_MIGRACION)))
+    except Exception:
+        # Sin el archivo no se puede distinguir el origen: todo a manual, que ninguna recarga borra
+        claves_fuente = set()
+    conn.execute("UPDATE proyectos SET fuente = ?", (FUENTE_MANUAL,))
+    ids_fuente = [(FUENTE_MIGRACION, id_fila) for id_fila, clave in zip(df_filas['id'], claves(df_filas)) if clave in claves_fuente]
+    conn.executemany("UPDATE proyectos SET fuente = ? WHERE id = ?", ids_fuente)
+
+def bump_data_version(conn, particion):
+    conn.execute("UPDATE versiones SET version = version + 1 WHERE particion = ?", (particion,))
+
+def get_partitions():
     conn = sqlite3.connect(DB_NAME)
-    if pd.read_sql("SELECT COUNT(*) FROM proyectos", conn).iloc[0, 0] == 0:
+    df = pd.read_sql("SELECT particion, version FROM versiones ORDER BY particion", conn)
+    conn.close()
+    return df
+
+def get_data_version(fuentes=()):
+    """Versión de los datos visibles: la selección normalizada y los pares (partición, versión) que abarca."""
+    fuentes = tuple(sorted(fuentes))
+    df_versiones = get_partitions()
+    if fuentes:
+        df_versiones = df_versiones[df_versiones['particion'].isin(fuentes)]
+    # La selección forma parte de la clave: dos selecciones con las mismas particiones no comparten frames
+    return (fuentes, tuple(df_versiones.itertuples(index=False, name=None)))
+
+def partition_has_rows(conn, particion=None):
+    if particion is None:
+        return conn.execute("SELECT 1 FROM proyectos LIMIT 1").fetchone() is not None
+    return conn.execute("SELECT 1 FROM proyectos WHERE fuente = ? LIMIT 1", (particion,)).fetchone() is not None
+
+def refresh_sources(fuente_ids):
+    """Parsea en paralelo y reemplaza solo las particiones indicadas. Devuelve {fuente: error} (vacío = éxito)."""
+    resultados, errores = parse_sources(list(fuente_ids))
+    conn = sqlite3.connect(DB_NAME)
+    for fuente_id, df_fuente in resultados.items():
+        # Una transacción por partición: el fallo de una fuente no deshace las demás.
+        # to_sql confirma la transacción: versión, borrado e inserción quedan juntos
         try:
-            df = pd.read_csv(CSV_FILE_NAME, sep=',', encoding='utf-8', low_memory=False)
-            df['monto_contrato'] = pd.to_numeric(df['monto_contrato'], errors='coerce').fillna(0)
-            df['comuna'] = pd.to_numeric(df['comuna'], errors='coerce').fillna(0).astype(int)
-            for col in ['lat', 'lng']:
-                df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
-                df[col] = df[col].apply(lambda x: re.sub(r'[^\d.-]', '', x))
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-            df_clean = df[['nombre', 'etapa', 'tipo', 'monto_contrato', 'comuna', 'barrio', 'lat', 'lng', 'fecha_inicio', 'fecha_fin_inicial', 'licitacion_oferta_empresa']].copy()
-            df_clean['id'] = [str(uuid.uuid4()) for _ in range(len(df_clean))]
-            df_clean.to_sql('proyectos', conn, if_exists='append', index=False)
-            conn.close()
-            return True
-        except FileNotFoundError:
-            conn.close()
-            return False, "FileNotFound"
+            bump_data_version(conn, fuente_id)
+            conn.execute("DELETE FROM proyectos WHERE fuente = ?", (fuente_id,))
+            df_fuente.to_sql('proyectos', conn, if_exists='append', index=False)
+            conn.commit()
         except Exception as e:
-            conn.close()
-            return False, str(e)
+            conn.rollback()
+            errores[fuente_id] = str(e)
+    conn.close()
+    return errores
+
+@st.cache_data(ttl=600)
+def load_initial_sources():
+    conn = sqlite3.connect(DB_NAME)
+    pendientes = [fuente_id for fuente_id in FUENTES if not partition_has_rows(conn, fuente_id)]
     conn.close()
-    return True 
+    if not pendientes:
+        return {}
+    return refresh_sources(pendientes)
 
 @st.cache_data(ttl=60)
-def get_all_projects_from_db():
+def get_all_projects_from_db(fuentes=()):
     conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM proyectos", conn)
+    if fuentes:
+        # Filtra por partición usando el índice sobre 'fuente'
+        marcadores = ', '.join('?' * len(fuentes))
+        df = pd.read_sql(f"SELECT * FROM proyectos WHERE fuente IN ({marcadores}) ORDER BY id", conn, params=list(fuentes))
+    else:
+        df = pd.read_sql("SELECT * FROM proyectos ORDER BY id", conn)
     conn.close()
     return df
 
@@ -215,6 +281,18 @@ def logout():
 # --- 4. FUNCIONES DE LIMPIEZA Y ANÁLISIS DE DATOS ---
 # (Sin cambios en la lógica de Pandas)
 
+ETAPAS_MAP = {
+    'Finalizada': 'Finalizada', 'Finalizado': 'Finalizada', 'Proyecto finalizado': 'Finalizada',
+    'En ejecucion': 'En Ejecución', 'En ejecución': 'En Ejecución', 'En obra': 'En Ejecución',
+    'En licitacion': 'Planificada/Inactiva', 'En licitación': 'Planificada/Inactiva',
+    'Adjudicada': 'Planificada/Inactiva', 'En armado de pliegos': 'Planificada/Inactiva',
+    'En proyecto': 'Planificada/Inactiva',
+    'Rescisión': 'No Continúa', 'Neutralizada': 'No Continúa', 'Desestimada': 'No Continúa'
+}
+ETAPAS_NORMALIZADAS = ['Finalizada', 'En Ejecución', 'Planificada/Inactiva', 'No Continúa', 'Otras/Sin Dato']
+# Misma normalización que ETAPAS_MAP, expresada en SQL para los agregados del dashboard
+ETAPA_NORMALIZADA_SQL = "(CASE etapa " + " ".join(f"WHEN '{k}' THEN '{v}'" for k, v in ETAPAS_MAP.items()) + " ELSE 'Otras/Sin Dato' END)"
+
 @st.cache_data(show_spinner="Analizando datos y calculando métricas...", ttl=15)
 def clean_and_analyze(df):
     if df.empty:
@@ -231,15 +309,7 @@ def clean_and_analyze(df):
     diferencia_td = df_copy['fecha_fin_inicial'] - df_copy['fecha_inicio']
     diferencia_dias = diferencia_td.dt.days.fillna(0)
     df_copy['duracion_meses'] = (diferencia_dias / 30.4375).round(1)
-    etapas_map = {
-        'Finalizada': 'Finalizada', 'Finalizado': 'Finalizada', 'Proyecto finalizado': 'Finalizada',
-        'En ejecucion': 'En Ejecución', 'En ejecución': 'En Ejecución', 'En obra': 'En Ejecución',
-        'En licitacion': 'Planificada/Inactiva', 'En licitación': 'Planificada/Inactiva',
-        'Adjudicada': 'Planificada/Inactiva', 'En armado de pliegos': 'Planificada/Inactiva',
-        'En proyecto': 'Planificada/Inactiva',
-        'Rescisión': 'No Continúa', 'Neutralizada': 'No Continúa', 'Desestimada': 'No Continúa'
-    }
-    df_copy['etapa_normalizada'] = df_copy['etapa'].astype(str).map(etapas_map).fillna('Otras/Sin Dato')
+    df_copy['etapa_normalizada'] = df_copy['etapa'].astype(str).map(ETAPAS_MAP).fillna('Otras/Sin Dato')
     df_copy['demora_dias'] = np.where(
         df_copy['etapa_normalizada'] == 'Finalizada',
         np.random.randint(-15, 60, size=len(df_copy)), 0
@@ -257,6 +327,133 @@ def clean_and_analyze(df):
         df_copy['id'] = [str(uuid.uuid4()) for _ in range(len(df_copy))]
     return df_copy, metrics
 
+# Invariante: las posiciones de 'barrio_posiciones' solo valen para un frame con las mismas filas
+# en el mismo orden. get_all_projects_from_db ordena por id y clean_and_analyze conserva el orden,
+# así que la versión de datos (que incluye la selección de fuentes) identifica el frame.
+# get_barrio_view igual verifica los ids antes de usar las posiciones.
+@st.cache_resource(max_entries=4)
+def build_group_indices(data_version, _df_analyzed):
+    """Índices precomputados por versión de datos (barrio -> filas, barrio -> contratistas, valores distintos)."""
+    grupos_barrio = _df_analyzed.groupby('barrio', sort=False)
+    ids = _df_analyzed['id'].to_numpy()
+    return {
+        'barrio_posiciones': {barrio: np.asarray(pos) for barrio, pos in grupos_barrio.indices.items()},
+        'barrio_ids': {barrio: ids[pos] for barrio, pos in grupos_barrio.indices.items()},
+        'barrio_contratistas': grupos_barrio['licitacion_oferta_empresa'].agg(lambda s: frozenset(s.dropna())).to_dict(),
+        'barrios': sorted(grupos_barrio.indices.keys()),
+        'comunas': sorted(_df_analyzed['comuna'].dropna().unique().tolist()),
+        'tipos': sorted(_df_analyzed['tipo'].dropna().unique().tolist()),
+        'etapas': _df_analyzed['etapa'].dropna().unique().tolist(),
+        'nombre_por_id': dict(zip(_df_analyzed['id'], _df_analyzed['nombre'])),
+    }
+
+@st.cache_resource
+def get_filter_cache():
+    """LRU acotado compartido entre sesiones para vistas filtradas y agregados."""
+    return LRUCache(maxsize=FILTER_CACHE_SIZE), threading.Lock()
+
+def get_cached_view(clave, construir):
+    # Los resultados se comparten entre sesiones: quien los usa no debe modificarlos
+    cache, lock = get_filter_cache()
+    with lock:
+        resultado = cache.get(clave)
+    if resultado is None:
+        resultado = construir()
+        with lock:
+            cache[clave] = resultado
+    return resultado
+
+def get_barrio_view(df_analyzed, indices, data_version, barrio):
+    # Las columnas usadas por el informe solo dependen de la versión de datos
+    def construir():
+        posiciones = indices['barrio_posiciones'].get(barrio, np.empty(0, dtype=np.intp))
+        ids = indices['barrio_ids'].get(barrio, np.empty(0, dtype=object))
+        if posiciones.size and posiciones.max() < len(df_analyzed) and np.array_equal(df_analyzed['id'].to_numpy()[posiciones], ids):
+            return df_analyzed.iloc[posiciones]
+        # El frame no coincide con el que generó las posiciones: seleccionar por id
+        return df_analyzed[df_analyzed['id'].isin(ids)]
+    return get_cached_view((data_version, 'barrio', barrio), construir)
+
+def build_dashboard_filter(fecha_rango, comunas, tipos, etapas):
+    """Normaliza el estado de la barra de filtros a una tupla hashable (clave de caché)."""
+    fechas = tuple(fecha_rango) if fecha_rango else ()
+    desde = fechas[0].isoformat() if len(fechas) > 0 else None
+    hasta = fechas[1].isoformat() if len(fechas) > 1 else None
+    return (desde, hasta, tuple(sorted(int(c) for c in comunas)), tuple(sorted(tipos)), tuple(sorted(etapas)))
+
+def compile_filter_query(fuentes, filtro):
+    """Traduce fuentes y filtros a una única cláusula WHERE parametrizada sobre 'proyectos'."""
+    desde, hasta, comunas, tipos, etapas = filtro
+    condiciones, params = [], []
+    for columna, valores in [('fuente', fuentes), ('comuna', comunas), ('tipo', tipos), (ETAPA_NORMALIZADA_SQL, etapas)]:
+        if valores:
+            condiciones.append(f"{columna} IN ({', '.join('?' * len(valores))})")
+            params.extend(valores)
+    if desde:
+        condiciones.append("date(fecha_inicio) >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("date(fecha_inicio) <= ?")
+        params.append(hasta)
+    return (' AND '.join(condiciones) or '1=1'), params
+
+# Plan de agregados del dashboard: cada gráfico lee solo su consulta sobre el subconjunto filtrado
+DASHBOARD_AGGREGATES = {
+    'metricas': """
+        SELECT COUNT(*) AS proyectos, COALESCE(SUM(monto_contrato), 0) AS total_inversion,
+               COALESCE(SUM({etapa} = 'En Ejecución'), 0) AS proyectos_activos
+        FROM proyectos WHERE {where}""",
+    'inversion_barrio': """
+        SELECT barrio, SUM(monto_contrato) AS Total,
+               SUM(CASE WHEN {etapa} = 'En Ejecución' THEN monto_contrato ELSE 0 END) AS Activa,
+               SUM(CASE WHEN {etapa} = 'Finalizada' THEN monto_contrato ELSE 0 END) AS Finalizada
+        FROM proyectos WHERE {where} AND barrio IS NOT NULL GROUP BY barrio""",
+    'mapa': """
+        SELECT lat, lng, monto_contrato FROM proyectos
+        WHERE {where} AND lat > -34.71 AND lat < -34.53 AND lng > -58.54 AND lng < -58.33""",
+    'tendencia': """
+        SELECT CAST(strftime('%Y', fecha_inicio) AS INTEGER) AS anio_inicio, SUM(monto_contrato) AS monto_contrato
+        FROM proyectos WHERE {where} AND strftime('%Y', fecha_inicio) IS NOT NULL
+        GROUP BY anio_inicio ORDER BY anio_inicio""",
+    'tipologia': """
+        SELECT tipo, SUM(monto_contrato) AS monto_contrato FROM proyectos
+        WHERE {where} AND tipo IS NOT NULL GROUP BY tipo ORDER BY monto_contrato DESC LIMIT 10""",
+    'comuna_tipo': """
+        SELECT COALESCE(comuna, 0) AS comuna, tipo, SUM(monto_contrato) AS monto_contrato FROM proyectos
+        WHERE {where} AND tipo IS NOT NULL GROUP BY 1, tipo""",
+    'ejecucion': """
+        SELECT barrio, COUNT(nombre) AS Proyectos, SUM(monto_contrato) AS Inversion_Activa,
+               AVG(ROUND(COALESCE(julianday(fecha_fin_inicial) - julianday(fecha_inicio), 0) / 30.4375, 1)) AS Duracion_Promedio
+        FROM proyectos WHERE {where} AND {etapa} = 'En Ejecución' AND barrio IS NOT NULL GROUP BY barrio""",
+}
+
+def get_filter_options(fuentes, data_version):
+    """Opciones de la barra de filtros, calculadas en SQL una vez por versión de datos."""
+    def construir():
+        where, params = compile_filter_query(fuentes, (None, None, (), (), ()))
+        conn = sqlite3.connect(DB_NAME)
+        comunas = [fila[0] for fila in conn.execute(f"SELECT DISTINCT comuna FROM proyectos WHERE {where} AND comuna IS NOT NULL ORDER BY comuna", params)]
+        tipos = [fila[0] for fila in conn.execute(f"SELECT DISTINCT tipo FROM proyectos WHERE {where} AND tipo IS NOT NULL ORDER BY tipo", params)]
+        fecha_min, fecha_max = conn.execute(f"SELECT MIN(date(fecha_inicio)), MAX(date(fecha_inicio)) FROM proyectos WHERE {where}", params).fetchone()
+        conn.close()
+        return {
+            'comunas': comunas,
+            'tipos': tipos,
+            'fecha_min': date.fromisoformat(fecha_min) if fecha_min else None,
+            'fecha_max': date.fromisoformat(fecha_max) if fecha_max else None,
+        }
+    return get_cached_view((data_version, 'opciones'), construir)
+
+def run_dashboard_aggregate(nombre, fuentes, data_version, filtro):
+    """Ejecuta un agregado del plan, cacheado por (versión de datos, filtro)."""
+    def construir():
+        where, params = compile_filter_query(fuentes, filtro)
+        conn = sqlite3.connect(DB_NAME)
+        df = pd.read_sql(DASHBOARD_AGGREGATES[nombre].format(where=where, etapa=ETAPA_NORMALIZADA_SQL), conn, params=params)
+        conn.close()
+        return df
+    return get_cached_view((data_version, 'agregado', nombre, filtro), construir)
+
 def calculate_mro_index(df):
     finalizada = df[df['etapa_normalizada'] == 'Finalizada'].groupby('barrio')['monto_contrato'].sum()
     activa = df[df['etapa_normalizada'] == 'En Ejecución'].groupby('barrio')['monto_contrato'].sum()
@@ -315,9 +512,10 @@ def create_project_db(data):
     data['fecha_inicio'] = data['fecha_inicio'].strftime('%Y-%m-%d')
     data['fecha_fin_inicial'] = data['fecha_fin_inicial'].strftime('%Y-%m-%d')
     conn.execute(
-        "INSERT INTO proyectos (id, nombre, etapa, tipo, monto_contrato, comuna, barrio, lat, lng, fecha_inicio, fecha_fin_inicial, licitacion_oferta_empresa) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (str(uuid.uuid4()), data['nombre'], data['etapa'], data['tipo'], data['monto_contrato'], data['comuna'], data['barrio'], data['lat'], data['lng'], data['fecha_inicio'], data['fecha_fin_inicial'], data['licitacion_oferta_empresa'])
+        "INSERT INTO proyectos (id, nombre, etapa, tipo, monto_contrato, comuna, barrio, lat, lng, fecha_inicio, fecha_fin_inicial, licitacion_oferta_empresa, fuente) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), data['nombre'], data['etapa'], data['tipo'], data['monto_contrato'], data['comuna'], data['barrio'], data['lat'], data['lng'], data['fecha_inicio'], data['fecha_fin_inicial'], data['licitacion_oferta_empresa'], FUENTE_MANUAL)
     )
+    bump_data_version(conn, FUENTE_MANUAL)
     conn.commit()
     conn.close()
     st.cache_data.clear()
@@ -325,7 +523,10 @@ def create_project_db(data):
 
 def delete_project_db(project_id):
     conn = sqlite3.connect(DB_NAME)
+    fila = conn.execute("SELECT fuente FROM proyectos WHERE id=?", (project_id,)).fetchone()
     conn.execute("DELETE FROM proyectos WHERE id=?", (project_id,))
+    if fila:
+        bump_data_version(conn, fila[0])
     conn.commit()
     conn.close()
     st.cache_data.clear()
@@ -448,24 +649,52 @@ def draw_sidebar():
             st.session_state.page = "crud"
             st.rerun() 
         
+        st.markdown("---")
+        st.header("Fuentes de Datos")
+        st.multiselect("Particiones visibles (vacío = todas)", options=get_partitions()['particion'].tolist(), key='fuentes')
+        
         st.markdown("---")
         st.button("Cerrar Sesión", on_click=logout, type="secondary", use_container_width=True)
 
-def draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratista_df):
-    """Dibuja el contenido del Dashboard con el filtro del mapa corregido."""
+def draw_filter_bar(opciones):
+    """Dibuja la barra global de filtros y devuelve su estado como tupla hashable."""
+    with st.container():
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+        fecha_min, fecha_max = opciones['fecha_min'], opciones['fecha_max']
+        fecha_rango = col_f1.date_input("Fecha de Inicio", value=(fecha_min, fecha_max) if fecha_min else (),
+                                        min_value=fecha_min, max_value=fecha_max, key='filtro_fechas')
+        comunas = col_f2.multiselect("Comuna", options=opciones['comunas'], format_func=lambda x: f"Comuna {x}", key='filtro_comunas')
+        tipos = col_f3.multiselect("Tipo", options=opciones['tipos'], key='filtro_tipos')
+        etapas = col_f4.multiselect("Etapa", options=ETAPAS_NORMALIZADAS, key='filtro_etapas')
+    if fecha_rango and tuple(fecha_rango) == (fecha_min, fecha_max):
+        fecha_rango = () # Rango completo: no excluir proyectos sin fecha de inicio
+    return build_dashboard_filter(fecha_rango, comunas, tipos, etapas)
+
+def draw_dashboard_content(fuentes, data_version, opciones):
+    """Dibuja el contenido del Dashboard a partir de agregados SQL filtrados y cacheados."""
     
     st.title("🏙️ Observatorio Inmobiliario Urbano")
     st.header("Dashboard de Oportunidades (Estrategia Predictiva)")
     
+    filtro = draw_filter_bar(opciones)
+    df_metricas = run_dashboard_aggregate('metricas', fuentes, data_version, filtro)
+    if df_metricas['proyectos'].iloc[0] == 0:
+        st.info("No hay proyectos que coincidan con los filtros seleccionados.")
+        return
+    
+    df_barrios = run_dashboard_aggregate('inversion_barrio', fuentes, data_version, filtro)
+    top_barrio = df_barrios.nlargest(1, 'Total')['barrio'].iloc[0] if not df_barrios.empty else "N/A"
+    mro_index = (df_barrios['Activa'] / df_barrios['Finalizada']).where(df_barrios['Finalizada'] > 0)
+    
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Inversión Total", f"${metrics['total_inversion']:,.0f}", help="Monto total contratado en el dataset.")
+        st.metric("Inversión Total", f"${df_metricas['total_inversion'].iloc[0]:,.0f}", help="Monto total contratado en la selección.")
     with col2:
-        st.metric("Proyectos Activos", f"{metrics['proyectos_activos']} Proyectos", help="Obras en etapa 'En Ejecución'.")
+        st.metric("Proyectos Activos", f"{df_metricas['proyectos_activos'].iloc[0]} Proyectos", help="Obras en etapa 'En Ejecución'.")
     with col3:
-        st.metric("Top Barrio", metrics['top_barrio'].split(' ')[0], help="Barrio con mayor inversión total.")
+        st.metric("Top Barrio", top_barrio.split(' ')[0], help="Barrio con mayor inversión total.")
     with col4:
-        mro_avg = mro_index_df['MRO Index'].mean() if not mro_index_df['MRO Index'].empty else 0
+        mro_avg = mro_index.mean() if mro_index.notna().any() else 0
         st.metric("Índice MRO Promedio", f"{mro_avg:.2f}", help="Ratio Inversión Activa/Finalizada. > 1 = Alto Crecimiento.")
     
     st.markdown("---")
@@ -475,11 +704,8 @@ def draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratist
     with col_map_real:
         st.subheader("Mapa de Intensidad de Proyectos")
         
-        # Corrección del Mapa: Filtro de Bounding Box para CABA
-        df_map = df_analyzed[
-            (df_analyzed['lat'] > -34.71) & (df_analyzed['lat'] < -34.53) &
-            (df_analyzed['lng'] > -58.54) & (df_analyzed['lng'] < -58.33)
-        ].copy()
+        # Corrección del Mapa: el Bounding Box de CABA se aplica en la consulta
+        df_map = run_dashboard_aggregate('mapa', fuentes, data_version, filtro)
         
         if df_map.empty:
             st.warning("""
@@ -487,9 +713,8 @@ def draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratist
             del rango de CABA.
             """)
         else:
-            df_map['size_map'] = np.log(df_map['monto_contrato'] + 1)
             st.map(
-                df_map,
+                df_map.assign(size_map=np.log(df_map['monto_contrato'] + 1)),
                 latitude='lat',
                 longitude='lng',
                 size='size_map',
@@ -501,17 +726,18 @@ def draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratist
     with col_trend:
         with st.container(): 
             st.subheader("Evolución (Tendencia)")
-            df_analyzed['anio_inicio'] = df_analyzed['fecha_inicio'].dt.year
-            df_trend = df_analyzed.groupby('anio_inicio')['monto_contrato'].sum().reset_index()
-            df_trend = df_trend[df_trend['anio_inicio'].notna()].sort_values(by='anio_inicio')
+            df_trend = run_dashboard_aggregate('tendencia', fuentes, data_version, filtro)
             
-            fig_trend = px.area(df_trend, x='anio_inicio', y='monto_contrato', 
-                                title='Inversión Contratada por Año',
-                                labels={'monto_contrato': 'Monto (ARS)', 'anio_inicio': 'Año'},
-                                markers=True)
-            fig_trend.update_traces(line=dict(color=st.get_option("theme.primaryColor")), fillcolor='rgba(0,128,0,0.2)')
-            fig_trend.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-            st.plotly_chart(fig_trend, use_container_width=True)
+            if df_trend.empty:
+                st.info(SIN_DATOS_FILTRO)
+            else:
+                fig_trend = px.area(df_trend, x='anio_inicio', y='monto_contrato', 
+                                    title='Inversión Contratada por Año',
+                                    labels={'monto_contrato': 'Monto (ARS)', 'anio_inicio': 'Año'},
+                                    markers=True)
+                fig_trend.update_traces(line=dict(color=st.get_option("theme.primaryColor")), fillcolor='rgba(0,128,0,0.2)')
+                fig_trend.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+                st.plotly_chart(fig_trend, use_container_width=True)
 
     st.markdown("---")
     
@@ -519,45 +745,48 @@ def draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratist
     with col_vis_1:
         with st.container():
             st.subheader("Prioridad de Inversión (Tipología)")
-            df_inversion_tipo = df_analyzed.groupby('tipo')['monto_contrato'].sum().reset_index()
-            df_inversion_tipo = df_inversion_tipo.sort_values(by='monto_contrato', ascending=False).head(10)
-            fig_inversion = px.bar(df_inversion_tipo, x='monto_contrato', y='tipo', orientation='h', 
-                                   labels={'monto_contrato': 'Monto (ARS)', 'tipo': 'Tipo de Proyecto'}, 
-                                   color='monto_contrato', color_continuous_scale=px.colors.sequential.Greens_r)
-            fig_inversion.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig_inversion, use_container_width=True)
+            df_inversion_tipo = run_dashboard_aggregate('tipologia', fuentes, data_version, filtro)
+            if df_inversion_tipo.empty:
+                st.info(SIN_DATOS_FILTRO)
+            else:
+                fig_inversion = px.bar(df_inversion_tipo, x='monto_contrato', y='tipo', orientation='h', 
+                                       labels={'monto_contrato': 'Monto (ARS)', 'tipo': 'Tipo de Proyecto'}, 
+                                       color='monto_contrato', color_continuous_scale=px.colors.sequential.Greens_r)
+                fig_inversion.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', yaxis={'categoryorder':'total ascending'})
+                st.plotly_chart(fig_inversion, use_container_width=True)
     with col_vis_2:
         with st.container():
             st.subheader("Distribución por Comuna")
-            df_treemap = df_analyzed.groupby(['comuna', 'tipo'])['monto_contrato'].sum().reset_index()
-            df_treemap['comuna_str'] = 'Comuna ' + df_treemap['comuna'].astype(str)
-            fig_treemap = px.treemap(df_treemap, path=[px.Constant("CABA"), 'comuna_str', 'tipo'], 
-                                     values='monto_contrato', color='monto_contrato', 
-                                     color_continuous_scale='Greens', title="Concentración por Comuna y Tipo")
-            fig_treemap.update_layout(paper_bgcolor='rgba(0,0,0,0)')
-            st.plotly_chart(fig_treemap, use_container_width=True)
+            df_treemap = run_dashboard_aggregate('comuna_tipo', fuentes, data_version, filtro)
+            if df_treemap.empty:
+                st.info(SIN_DATOS_FILTRO)
+            else:
+                df_treemap = df_treemap.assign(comuna_str='Comuna ' + df_treemap['comuna'].astype(str))
+                fig_treemap = px.treemap(df_treemap, path=[px.Constant("CABA"), 'comuna_str', 'tipo'], 
+                                         values='monto_contrato', color='monto_contrato', 
+                                         color_continuous_scale='Greens', title="Concentración por Comuna y Tipo")
+                fig_treemap.update_layout(paper_bgcolor='rgba(0,0,0,0)')
+                st.plotly_chart(fig_treemap, use_container_width=True)
 
     st.markdown("---")
     
     with st.container():
         st.subheader("Proyectos en Ejecución (Ventana de Oportunidad)")
-        df_ejecucion = df_analyzed[df_analyzed['etapa_normalizada'] == 'En Ejecución']
-        df_ejecucion_grouped = df_ejecucion.groupby('barrio').agg(
-            Proyectos=('nombre', 'count'),
-            Inversion_Activa=('monto_contrato', 'sum'),
-            Duracion_Promedio=('duracion_meses', 'mean')
-        ).reset_index()
-        df_ejecucion_grouped['Duracion_Promedio'] = df_ejecucion_grouped['Duracion_Promedio'].round(1)
-        st.dataframe(df_ejecucion_grouped.sort_values(by='Inversion_Activa', ascending=False), 
-                     hide_index=True, use_container_width=True,
-                     column_config={
-                         "barrio": "Barrio", 
-                         "Inversion_Activa": st.column_config.NumberColumn("Inversión Activa (ARS)", format="$ %i"), 
-                         "Duracion_Promedio": st.column_config.NumberColumn("Duración Promedio (Meses)", format="%.1f meses"), 
-                         "Proyectos": st.column_config.NumberColumn("Conteo")
-                     })
-
-def draw_riesgo_page(df_analyzed, metrics, mro_index_df, demora_contratista_df):
+        df_ejecucion_grouped = run_dashboard_aggregate('ejecucion', fuentes, data_version, filtro)
+        if df_ejecucion_grouped.empty:
+            st.info("No hay proyectos en ejecución para los filtros seleccionados.")
+        else:
+            df_ejecucion_grouped = df_ejecucion_grouped.assign(Duracion_Promedio=df_ejecucion_grouped['Duracion_Promedio'].round(1))
+            st.dataframe(df_ejecucion_grouped.sort_values(by='Inversion_Activa', ascending=False), 
+                         hide_index=True, use_container_width=True,
+                         column_config={
+                             "barrio": "Barrio", 
+                             "Inversion_Activa": st.column_config.NumberColumn("Inversión Activa (ARS)", format="$ %i"), 
+                             "Duracion_Promedio": st.column_config.NumberColumn("Duración Promedio (Meses)", format="%.1f meses"), 
+                             "Proyectos": st.column_config.NumberColumn("Conteo")
+                         })
+
+def draw_riesgo_page(df_analyzed, metrics, mro_index_df, demora_contratista_df, indices, data_version):
     """Dibuja el contenido de Riesgo Operacional."""
     st.title("🏙️ Observatorio Inmobiliario Urbano")
     st.header("Análisis de Riesgo Operacional (Modelo de Contratistas)")
@@ -576,16 +805,16 @@ def draw_riesgo_page(df_analyzed, metrics, mro_index_df, demora_contratista_df):
     st.markdown("---")
     with st.container():
         st.subheader("Generador de Informe Ejecutivo (Simulador de Decisión)")
-        valid_barrios = sorted(df_analyzed['barrio'].dropna().unique().tolist())
-        selected_barrio = st.selectbox("Seleccione el Barrio para el Informe:", options=valid_barrios)
-        contratistas_en_barrio = df_analyzed[df_analyzed['barrio'] == selected_barrio]['licitacion_oferta_empresa'].unique()
+        selected_barrio = st.selectbox("Seleccione el Barrio para el Informe:", options=indices['barrios'])
+        contratistas_en_barrio = indices['barrio_contratistas'].get(selected_barrio, frozenset())
         df_demora_filtrada = demora_contratista_df[demora_contratista_df['licitacion_oferta_empresa'].isin(contratistas_en_barrio)]
         if st.button("Generar Informe Predictivo", type="primary"):
-            report = generate_executive_report(df_analyzed[df_analyzed['barrio'] == selected_barrio], selected_barrio, df_demora_filtrada, mro_index_df)
+            df_barrio = get_barrio_view(df_analyzed, indices, data_version, selected_barrio)
+            report = generate_executive_report(df_barrio, selected_barrio, df_demora_filtrada, mro_index_df)
             st.markdown(report)
             st.success("Informe generado con éxito.")
 
-def draw_crud_page(df_analyzed):
+def draw_crud_page(df_analyzed, indices):
     """Dibuja la página de Administración."""
     st.title("🏙️ Observatorio Inmobiliario Urbano")
     st.header("Administración (CRUD) y Gestión de Usuarios")
@@ -597,14 +826,11 @@ def draw_crud_page(df_analyzed):
                 st.markdown("##### Nuevo Proyecto")
                 nombre = st.text_input("Nombre del Proyecto")
                 col_form_1, col_form_2 = st.columns(2)
-                comuna_options = sorted(df_analyzed['comuna'].dropna().unique().tolist())
-                comuna = col_form_1.selectbox("Comuna", options=comuna_options)
+                comuna = col_form_1.selectbox("Comuna", options=indices['comunas'])
                 barrio = col_form_2.text_input("Barrio")
-                tipo_options = sorted(df_analyzed['tipo'].dropna().unique().tolist())
-                tipo = st.selectbox("Tipo de Proyecto", options=tipo_options)
+                tipo = st.selectbox("Tipo de Proyecto", options=indices['tipos'])
                 monto_contrato = st.number_input("Monto Contratado (ARS)", min_value=0.0, format="%f")
-                etapa_original_options = df_analyzed['etapa'].dropna().unique().tolist()
-                etapa = st.selectbox("Etapa (Texto Original)", options=etapa_original_options)
+                etapa = st.selectbox("Etapa (Texto Original)", options=indices['etapas'])
                 col_form_3, col_form_4 = st.columns(2)
                 lat = col_form_3.number_input("Latitud", format="%f", value=-34.6037)
                 lng = col_form_4.number_input("Longitud", format="%f", value=-58.3816)
@@ -620,11 +846,10 @@ def draw_crud_page(df_analyzed):
                     st.rerun() 
         with st.container():
             st.markdown("##### Eliminar Proyecto")
-            df_crud_display = df_analyzed.copy()
-            df_crud_display = df_crud_display[['id', 'nombre', 'barrio', 'etapa_normalizada', 'monto_contrato']]
+            nombre_por_id = indices['nombre_por_id']
             selected_id_delete = st.selectbox("Seleccionar ID de Proyecto para Eliminar", 
-                                                options=df_analyzed['id'].tolist(), 
-                                                format_func=lambda x: f"{df_analyzed[df_analyzed['id'] == x]['nombre'].values[0]} (ID: ...{x[-6:]})",
+                                                options=list(nombre_por_id), 
+                                                format_func=lambda x: f"{nombre_por_id[x]} (ID: ...{x[-6:]})",
                                                 index=None, key='delete_select')
             if st.button("Confirmar Eliminación", type="secondary"):
                 if selected_id_delete:
@@ -647,6 +872,23 @@ def draw_crud_page(df_analyzed):
                         st.rerun() 
                     else:
                         st.error(f"Error al actualizar el rol de {user_to_modify}.")
+        with st.container():
+            st.subheader("Fuentes de Datos")
+            df_particiones = get_partitions()
+            df_particiones['filas'] = df_particiones['particion'].map(df_analyzed['fuente'].value_counts()).fillna(0).astype(int)
+            st.dataframe(df_particiones, hide_index=True, use_container_width=True,
+                         column_config={"particion": "Partición", "version": "Versión de Datos", "filas": "Proyectos Visibles"})
+            fuentes_a_recargar = st.multiselect("Fuentes a Recargar", options=list(FUENTES),
+                                                format_func=lambda x: FUENTES[x]['descripcion'], key='fuentes_recargar')
+            if st.button("Recargar Fuentes", type="primary"):
+                if fuentes_a_recargar:
+                    errores = refresh_sources(fuentes_a_recargar)
+                    st.cache_data.clear()
+                    if not errores:
+                        st.success(f"Fuentes recargadas: {', '.join(fuentes_a_recargar)}.")
+                        st.rerun()
+                    else:
+                        st.error("Error al recargar fuentes: " + "; ".join(f"{fuente_id}: {error}" for fuente_id, error in errores.items()))
 
 # --- 7. LÓGICA PRINCIPAL DE RENDERIZADO (El Controlador) ---
 
@@ -655,12 +897,17 @@ def draw_crud_page(df_analyzed):
 def main():
     # 1. Ejecutar inicialización de DB
     init_db()
-    initial_load_result = load_initial_data_from_csv()
-    if initial_load_result is True:
-        st.session_state.initial_load_success = True
-    elif initial_load_result[0] is False:
-        st.error(f"FALLA CRÍTICA DE CARGA: {initial_load_result[1]}. La aplicación no puede funcionar sin datos.")
-        return # Detener la app si la carga inicial falla
+    errores_carga = load_initial_sources()
+    if errores_carga:
+        detalle = "; ".join(f"{fuente_id}: {error}" for fuente_id, error in errores_carga.items())
+        conn = sqlite3.connect(DB_NAME)
+        hay_datos = partition_has_rows(conn)
+        conn.close()
+        if not hay_datos:
+            st.error(f"FALLA CRÍTICA DE CARGA: {detalle}. La aplicación no puede funcionar sin datos.")
+            return # Detener la app solo si ninguna partición tiene datos
+        st.warning(f"Algunas fuentes no se pudieron cargar: {detalle}.")
+    st.session_state.initial_load_success = True
 
     # 2. Inicializar la página actual si no está definida
     if 'page' not in st.session_state:
@@ -672,31 +919,38 @@ def main():
         
     # 4. Mostrar la aplicación si está autenticado
     else:
-        # Cargar y analizar los datos actuales
-        df_raw = get_all_projects_from_db()
+        # Dibujar la barra lateral de navegación (antes de cargar, para poder cambiar de fuente)
+        draw_sidebar()
+
+        fuentes = tuple(sorted(st.session_state.fuentes))
+        data_version = get_data_version(fuentes)
+
+        # El dashboard trabaja solo con agregados SQL: no carga la tabla completa
+        if st.session_state.page == "dashboard":
+            draw_dashboard_content(fuentes, data_version, get_filter_options(fuentes, data_version))
+            return
+        if st.session_state.page not in ("riesgo", "crud") or (st.session_state.page == "crud" and st.session_state.role != 'admin'):
+            # Fallback
+            st.session_state.page = "dashboard"
+            st.rerun()
+
+        # Cargar y analizar los datos actuales de las particiones seleccionadas
+        df_raw = get_all_projects_from_db(fuentes)
         if df_raw.empty:
             st.error("No se pudieron cargar los datos de los proyectos desde la base de datos.")
             return
 
         df_analyzed, metrics = clean_and_analyze(df_raw)
-        df_finalizadas_only = df_analyzed[df_analyzed['etapa_normalizada'] == 'Finalizada']
-        demora_contratista_df = get_contratista_demora(df_finalizadas_only)
-        mro_index_df = calculate_mro_index(df_analyzed)
-
-        # Dibujar la barra lateral de navegación
-        draw_sidebar()
+        indices = build_group_indices(data_version, df_analyzed)
 
         # Determinar qué contenido dibujar basado en el estado de la sesión
-        if st.session_state.page == "dashboard":
-            draw_dashboard_content(df_analyzed, metrics, mro_index_df, demora_contratista_df)
-        elif st.session_state.page == "riesgo":
-            draw_riesgo_page(df_analyzed, metrics, mro_index_df, demora_contratista_df)
-        elif st.session_state.page == "crud" and st.session_state.role == 'admin':
-            draw_crud_page(df_analyzed)
+        if st.session_state.page == "riesgo":
+            df_finalizadas_only = df_analyzed[df_analyzed['etapa_normalizada'] == 'Finalizada']
+            demora_contratista_df = get_contratista_demora(df_finalizadas_only)
+            mro_index_df = calculate_mro_index(df_analyzed)
+            draw_riesgo_page(df_analyzed, metrics, mro_index_df, demora_contratista_df, indices, data_version)
         else:
-            # Fallback
-            st.session_state.page = "dashboard"
-            st.rerun()
+            draw_crud_page(df_analyzed, indices)
 
 if __name__ == "__main__":
     main()